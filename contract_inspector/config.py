@@ -35,6 +35,13 @@ class Config:
         self.request_timeout = int(os.getenv("REQUEST_TIMEOUT", "30"))
         self.max_retries = int(os.getenv("MAX_RETRIES", "3"))
         self.rate_limit_per_second = int(os.getenv("RATE_LIMIT_PER_SECOND", "4"))
+        self.max_concurrent_calls = int(os.getenv("MAX_CONCURRENT_CALLS", "10"))
+        
+        # 缓存配置（已验证合约的 ABI/源代码不可变，缓存永不过期）
+        self.cache_enabled = os.getenv("NO_CACHE", "").lower() not in ("1", "true", "yes")
+        self.cache_dir = os.path.expanduser(
+            os.getenv("CACHE_DIR", "~/.cache/contract_inspector")
+        )
         
     def validate(self) -> bool:
         """验证配置是否有效"""
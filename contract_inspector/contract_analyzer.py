@@ -3,7 +3,8 @@
 """
 
 import json
-from typing import Dict, List, Optional, Any
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Any, Union
 from datetime import datetime
 
 from .etherscan_client import EtherscanClient
@@ -11,7 +12,7 @@ from .web3_client import Web3Client
 from .utils import (
     is_valid_ethereum_address, 
     to_checksum_address, 
-    extract_view_functions,
+    extract_view_call_plan,
     format_function_result
 )
 
@@ -23,6 +24,7 @@ class ContractAnalyzer:
         self.etherscan_client = EtherscanClient()
         self.web3_client = Web3Client()
         self._initialized = False
+        self._init_lock = asyncio.Lock()
     
     async def initialize(self) -> bool:
         """
@@ -34,28 +36,51 @@ class ContractAnalyzer:
         if self._initialized:
             return True
         
-        # 验证 Web3 连接
-        connection_ok = await self.web3_client.verify_connection()
-        if not connection_ok:
-            print("❌ Web3 连接失败，无法继续")
-            return False
+        return await self._initialize_once()
+    
+    async def _initialize_once(self) -> bool:
+        """
+        执行初始化，加锁保证并发的首次调用只验证一次连接
         
-        self._initialized = True
-        print("✅ 合约分析器初始化成功")
-        return True
+        Returns:
+            bool: 初始化是否成功
+        """
+        async with self._init_lock:
+            if self._initialized:
+                return True
+            
+            # 验证 Web3 连接
+            connection_ok = await self.web3_client.verify_connection()
+            if not connection_ok:
+                print("❌ Web3 连接失败，无法继续")
+                return False
+            
+            self._initialized = True
+            print("✅ 合约分析器初始化成功")
+            return True
+    
+    async def close(self) -> None:
+        """释放客户端持有的网络连接等资源"""
+        await self.etherscan_client.close()
+        await self.web3_client.close()
     
-    async def analyze_contract(self, contract_address: str) -> Dict[str, Any]:
+    async def analyze_contract(
+        self, 
+        contract_address: Union[str, bytes], 
+        on_result: Optional[Callable[[Dict[str, Any], int, int], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
         """
         分析合约信息 - 主要业务逻辑
         
         Args:
-            contract_address: 合约地址
+            contract_address: 合约地址（字符串或 20 字节地址）
+            on_result: 可选回调，每个函数调用完成时以 (结果, 已完成数, 总数) 调用
             
         Returns:
             Dict: 分析结果
         """
-        # 初始化检查
-        if not await self.initialize():
+        # 初始化检查（已初始化时不再 await，避免多余的事件循环调度）
+        if not self._initialized and not await self._initialize_once():
             return {
                 "status": "error",
                 "error": "分析器初始化失败",
@@ -73,18 +98,21 @@ class ContractAnalyzer:
         # 转换为校验和格式
         checksum_address = to_checksum_address(contract_address)
         
-        # 步骤2: 检查是否为合约地址
-        is_contract = await self.web3_client.is_contract_address(checksum_address)
-        if not is_contract:
+        # 步骤2+3: 并发检查是否为合约地址并从 Etherscan 获取合约信息（ABI、名称等）
+        # 已验证的合约必然有代码，因此获取到 ABI 即视为合约地址
+        print(f"📡 正在获取合约 {checksum_address} 的 ABI...")
+        is_contract, contract_meta = await asyncio.gather(
+            self.web3_client.is_contract_address(checksum_address),
+            self.etherscan_client.get_contract_full(checksum_address)
+        )
+        abi = contract_meta["abi"] if contract_meta else None
+        if not is_contract and not abi:
             return {
                 "status": "error",
                 "error": f"地址 {checksum_address} 不是合约地址",
                 "timestamp": datetime.now().isoformat()
             }
         
-        # 步骤3: 从 Etherscan 获取合约 ABI
-        print(f"📡 正在获取合约 {checksum_address} 的 ABI...")
-        abi = await self.etherscan_client.get_contract_abi(checksum_address)
         if not abi:
             return {
                 "status": "error",
@@ -94,8 +122,8 @@ class ContractAnalyzer:
             }
         
         # 步骤4: 筛选无参数的 view 函数
-        view_functions = extract_view_functions(abi)
-        if not view_functions:
+        function_names, output_types = extract_view_call_plan(abi)
+        if not function_names:
             return {
                 "status": "warning",
                 "message": "合约中没有找到无参数的 view 函数",
@@ -104,7 +132,7 @@ class ContractAnalyzer:
                 "timestamp": datetime.now().isoformat()
             }
         
-        print(f"🔍 找到 {len(view_functions)} 个无参数的 view 函数")
+        print(f"🔍 找到 {len(function_names)} 个无参数的 view 函数")
         
         # 步骤5: 创建合约实例
         contract = await self.web3_client.get_contract_instance(checksum_address, abi)
@@ -117,22 +145,24 @@ class ContractAnalyzer:
             }
         
         # 步骤6: 批量调用 view 函数
-        function_names = [func["name"] for func in view_functions]
         print(f"🚀 正在调用 {len(function_names)} 个函数...")
         
-        call_results = await self.web3_client.batch_call_view_functions(
+        call_results = {}
+        async for result in self.web3_client.iter_view_function_results(
             contract, function_names
-        )
+        ):
+            call_results[result["function_name"]] = result
+            if on_result is not None:
+                await on_result(result, len(call_results), len(function_names))
         
         # 步骤7: 处理和格式化结果
         successful_calls = []
         failed_calls = []
         
-        for i, result in enumerate(call_results):
+        for func_name in function_names:
+            result = call_results[func_name]
             if result["status"] == "success":
-                # 获取函数的输出类型信息
-                func_info = view_functions[i]
-                output_type = self._get_output_type(func_info)
+                output_type = output_types[result["function_name"]]
                 
                 formatted_result = {
                     "function_name": result["function_name"],
@@ -156,16 +186,13 @@ class ContractAnalyzer:
                     "status": "failed"
                 })
         
-        # 获取额外的合约信息
-        contract_name = await self.etherscan_client.get_contract_name(checksum_address)
-        
         # 组装最终结果
         final_result = {
             "status": "success",
             "contract_address": checksum_address,
-            "contract_name": contract_name,
+            "contract_name": contract_meta["name"],
             "analysis_summary": {
-                "total_view_functions": len(view_functions),
+                "total_view_functions": len(function_names),
                 "successful_calls": len(successful_calls),
                 "failed_calls": len(failed_calls)
             },
@@ -178,25 +205,6 @@ class ContractAnalyzer:
         
         return final_result
     
-    def _get_output_type(self, func_info: Dict) -> str:
-        """
-        获取函数输出类型
-        
-        Args:
-            func_info: 函数信息
-            
-        Returns:
-            str: 输出类型
-        """
-        outputs = func_info.get("outputs", [])
-        if not outputs:
-            return "void"
-        
-        if len(outputs) == 1:
-            return outputs[0].get("type", "unknown")
-        else:
-            return "tuple"
-    
     def _format_large_number(self, value: int) -> str:
         """
         格式化大数值
@@ -216,12 +224,12 @@ class ContractAnalyzer:
         else:
             return str(value)
     
-    async def get_contract_summary(self, contract_address: str) -> Dict[str, Any]:
+    async def get_contract_summary(self, contract_address: Union[str, bytes]) -> Dict[str, Any]:
         """
         获取合约基本信息摘要
         
         Args:
-            contract_address: 合约地址
+            contract_address: 合约地址（字符串或 20 字节地址）
             
         Returns:
             Dict: 合约摘要信息
@@ -231,12 +239,19 @@ class ContractAnalyzer:
         
         checksum_address = to_checksum_address(contract_address)
         
+        # 合约信息与链上代码检查互不依赖，并发发起；
+        # 是否已验证和合约名称都从同一次 getsourcecode 请求中获取
+        contract_meta, is_contract = await asyncio.gather(
+            self.etherscan_client.get_contract_full(checksum_address),
+            self.web3_client.is_contract_address(checksum_address)
+        )
+        
         # 基本信息
         summary = {
             "address": checksum_address,
-            "is_contract": await self.web3_client.is_contract_address(checksum_address),
-            "is_verified": await self.etherscan_client.is_contract_verified(checksum_address),
-            "contract_name": await self.etherscan_client.get_contract_name(checksum_address)
+            "is_contract": is_contract,
+            "is_verified": bool(contract_meta and contract_meta["is_verified"]),
+            "contract_name": contract_meta["name"] if contract_meta else None
         }
         
-        return summary 
\ No newline at end of file
+        return summary
\ No newline at end of file
@@ -2,14 +2,99 @@
 Etherscan API 客户端
 """
 
-import json
+import os
 import asyncio
 from typing import Dict, List, Optional, Any
-import requests
-from asyncio_throttle import Throttler
+import aiohttp
+import orjson
+import aiosqlite
+from aiolimiter import AsyncLimiter
 
+from . import __version__
 from .config import config
-from .utils import safe_json_loads, retry_with_backoff
+from .utils import parse_retry_after, safe_json_loads, retry_async, to_checksum_address
+
+
+class EtherscanRateLimitError(Exception):
+    """Etherscan 限速错误"""
+
+
+class AbiCache:
+    """合约 ABI / 源代码的本地持久化缓存（SQLite），以 (chain_id, 地址) 为键"""
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._db: Optional[aiosqlite.Connection] = None
+        self._lock = asyncio.Lock()
+    
+    async def _get_db(self) -> aiosqlite.Connection:
+        """
+        获取数据库连接（惰性创建并建表）
+        
+        Returns:
+            aiosqlite.Connection: 数据库连接
+        """
+        async with self._lock:
+            if self._db is None:
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+                db = await aiosqlite.connect(self.db_path)
+                await db.execute(
+                    "CREATE TABLE IF NOT EXISTS contracts ("
+                    "chain_id INTEGER NOT NULL, "
+                    "address TEXT NOT NULL, "
+                    "source_json TEXT, "
+                    "PRIMARY KEY (chain_id, address))"
+                )
+                await db.commit()
+                self._db = db
+            return self._db
+    
+    async def get_source(self, chain_id: int, address: str) -> Optional[str]:
+        """
+        读取缓存的源代码信息 JSON 字符串
+        
+        Args:
+            chain_id: 链 ID
+            address: 合约地址
+            
+        Returns:
+            Optional[str]: 源代码信息 JSON 字符串或 None
+        """
+        db = await self._get_db()
+        async with db.execute(
+            "SELECT source_json FROM contracts WHERE chain_id = ? AND address = ?",
+            (chain_id, to_checksum_address(address))
+        ) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+    
+    async def set_source(
+        self, 
+        chain_id: int, 
+        address: str, 
+        source_json: str
+    ) -> None:
+        """
+        写入源代码信息 JSON 字符串（其中已包含 ABI 和合约名称）
+        
+        Args:
+            chain_id: 链 ID
+            address: 合约地址
+            source_json: 源代码信息 JSON 字符串
+        """
+        db = await self._get_db()
+        await db.execute(
+            "INSERT OR REPLACE INTO contracts (chain_id, address, source_json) "
+            "VALUES (?, ?, ?)",
+            (chain_id, to_checksum_address(address), source_json)
+        )
+        await db.commit()
+    
+    async def close(self) -> None:
+        """关闭数据库连接"""
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
 
 
 class EtherscanClient:
@@ -19,9 +104,101 @@ class EtherscanClient:
         self.base_url = config.etherscan_base_url
         self.api_key = config.etherscan_api_key
         self.timeout = config.request_timeout
-        self.throttler = Throttler(rate_limit=config.rate_limit_per_second, period=1)
+        self.limiter = AsyncLimiter(config.rate_limit_per_second, 1.0)
+        self._backoff_until = 0.0
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.cache: Optional[AbiCache] = (
+            AbiCache(os.path.join(config.cache_dir, "etherscan.db"))
+            if config.cache_enabled else None
+        )
+    
+    def _ensure_session(self) -> aiohttp.ClientSession:
+        """
+        获取共享的 HTTP 会话（惰性创建）
+        
+        所有 API 方法共用同一个会话，保持长连接以复用 TCP/TLS 连接
+        
+        Returns:
+            aiohttp.ClientSession: HTTP 会话
+        """
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=10,
+                    limit_per_host=10,
+                    keepalive_timeout=30,
+                    ttl_dns_cache=300
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={
+                    "Accept": "application/json",
+                    "User-Agent": f"contract-inspector/{__version__}"
+                }
+            )
+        return self._session
+    
+    async def close(self) -> None:
+        """释放 HTTP 会话和缓存连接"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
         
+        if self.cache is not None:
+            await self.cache.close()
+        
+    async def _wait_for_backoff(self) -> None:
+        """等待服务端要求的退避时间结束"""
+        delay = self._backoff_until - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    def _apply_backoff(self, delay: float) -> None:
+        """
+        记录退避截止时间，之后的所有请求都会先等待
+        
+        Args:
+            delay: 退避时间（秒）
+        """
+        self._backoff_until = max(
+            self._backoff_until,
+            asyncio.get_running_loop().time() + delay
+        )
+    
     async def _make_request(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        发起 HTTP 请求，合并并发的相同请求
+        
+        同一时刻对相同参数的请求只会真正发出一次，
+        其余调用方等待第一个请求的结果
+        
+        Args:
+            params: 请求参数
+            
+        Returns:
+            Dict: 响应数据
+        """
+        key = tuple(sorted(params.items()))
+        
+        task = self._inflight.get(key)
+        if task is None:
+            # 请求在独立任务中执行，不属于任何一个调用方
+            task = asyncio.ensure_future(self._send_request(params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._on_inflight_done(key, done))
+        
+        # shield：任一调用方（包括第一个）被取消时都不影响共享的请求
+        return await asyncio.shield(task)
+    
+    def _on_inflight_done(self, key: tuple, task: asyncio.Task) -> None:
+        """请求完成后移出合并表"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有调用方都已取消时无人获取异常，这里标记为已获取以避免告警
+        if not task.cancelled():
+            task.exception()
+    
+    async def _send_request(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """
         发起 HTTP 请求
         
@@ -31,66 +208,84 @@ class EtherscanClient:
         Returns:
             Dict: 响应数据
         """
-        async with self.throttler:
-            # 添加 API key 和 chainid
-            params.update({
-                "apikey": self.api_key,
-                "chainid": config.chain_id
-            })
-            
-            def make_sync_request():
-                response = requests.get(
-                    self.base_url,
-                    params=params,
-                    timeout=self.timeout
-                )
-                response.raise_for_status()
-                return response.json()
+        # 添加 API key 和 chainid
+        params.update({
+            "apikey": self.api_key,
+            "chainid": str(config.chain_id)
+        })
+        
+        session = self._ensure_session()
+        
+        async def do_request():
+            await self._wait_for_backoff()
             
-            return await retry_with_backoff(
-                make_sync_request,
-                max_retries=config.max_retries
-            )
+            # 每次尝试（包括重试）都占用一个限速配额
+            async with self.limiter:
+                async with session.get(self.base_url, params=params) as response:
+                    if response.status == 429:
+                        self._apply_backoff(
+                            parse_retry_after(response.headers.get("Retry-After")) or 1.0
+                        )
+                    response.raise_for_status()
+                    data = await response.json(content_type=None)
+            
+            # Etherscan 超出限速时返回 200，并在 result 中给出提示
+            if (
+                isinstance(data, dict) and
+                data.get("status") == "0" and
+                "rate limit" in str(data.get("result", "")).lower()
+            ):
+                self._apply_backoff(1.0)
+                raise EtherscanRateLimitError(str(data.get("result")))
+            
+            return data
+        
+        return await retry_async(
+            do_request,
+            max_retries=config.max_retries,
+            retry_on=(EtherscanRateLimitError,)
+        )
+    
+    async def get_contract_full(self, contract_address: str) -> Optional[Dict[str, Any]]:
+        """
+        通过一次 getsourcecode 请求获取合约的 ABI、名称、验证状态和源代码信息
+        
+        Args:
+            contract_address: 合约地址
+            
+        Returns:
+            Optional[Dict]: 包含 abi、name、is_verified、source 的字典，获取失败时为 None
+        """
+        source_info = await self.get_contract_source_code(contract_address)
+        if not source_info:
+            return None
+        
+        # 未验证合约的 ABI 字段是提示文本，解析后不是列表
+        abi = safe_json_loads(source_info.get("ABI", ""))
+        if not isinstance(abi, list):
+            abi = None
+        
+        return {
+            "abi": abi,
+            "name": source_info.get("ContractName", "").strip() or None,
+            "is_verified": bool(source_info.get("SourceCode", "").strip() or abi),
+            "source": source_info
+        }
     
     async def get_contract_abi(self, contract_address: str) -> Optional[List[Dict]]:
         """
         获取合约 ABI
         
+        已弃用：请使用 get_contract_full，它在同一次请求中返回 ABI 和其他信息
+        
         Args:
             contract_address: 合约地址
             
         Returns:
             Optional[List[Dict]]: 合约 ABI 或 None
         """
-        try:
-            params = {
-                "module": "contract",
-                "action": "getabi",
-                "address": contract_address
-            }
-            
-            response = await self._make_request(params)
-            
-            if response.get("status") != "1":
-                print(f"获取 ABI 失败: {response.get('message', '未知错误')}")
-                return None
-            
-            abi_string = response.get("result", "")
-            if not abi_string:
-                print("ABI 数据为空")
-                return None
-            
-            # 解析 ABI JSON
-            abi = safe_json_loads(abi_string)
-            if not isinstance(abi, list):
-                print("ABI 格式无效")
-                return None
-            
-            return abi
-            
-        except Exception as e:
-            print(f"获取合约 ABI 时发生错误: {str(e)}")
-            return None
+        contract_meta = await self.get_contract_full(contract_address)
+        return contract_meta["abi"] if contract_meta else None
     
     async def get_contract_source_code(self, contract_address: str) -> Optional[Dict[str, Any]]:
         """
@@ -103,6 +298,16 @@ class EtherscanClient:
             Optional[Dict]: 合约源代码信息
         """
         try:
+            if self.cache is not None:
+                try:
+                    cached_source = await self.cache.get_source(config.chain_id, contract_address)
+                    if cached_source:
+                        source_info = safe_json_loads(cached_source)
+                        if isinstance(source_info, dict):
+                            return source_info
+                except Exception as e:
+                    print(f"读取源代码缓存失败: {str(e)}")
+            
             params = {
                 "module": "contract",
                 "action": "getsourcecode",
@@ -119,7 +324,20 @@ class EtherscanClient:
             if not result or not isinstance(result, list):
                 return None
             
-            return result[0] if result else None
+            source_info = result[0]
+            
+            # 仅缓存已验证合约，未验证的合约之后仍可能被验证
+            if self.cache is not None and isinstance(source_info, dict) and source_info.get("SourceCode"):
+                try:
+                    await self.cache.set_source(
+                        config.chain_id,
+                        contract_address,
+                        orjson.dumps(source_info).decode()
+                    )
+                except Exception as e:
+                    print(f"写入源代码缓存失败: {str(e)}")
+            
+            return source_info
             
         except Exception as e:
             print(f"获取合约源代码时发生错误: {str(e)}")
@@ -135,19 +353,8 @@ class EtherscanClient:
         Returns:
             bool: 是否已验证
         """
-        try:
-            source_info = await self.get_contract_source_code(contract_address)
-            if not source_info:
-                return False
-            
-            # 检查是否有源代码或 ABI
-            has_source = bool(source_info.get("SourceCode", "").strip())
-            has_abi = bool(source_info.get("ABI", "").strip())
-            
-            return has_source or has_abi
-            
-        except Exception:
-            return False
+        contract_meta = await self.get_contract_full(contract_address)
+        return bool(contract_meta and contract_meta["is_verified"])
     
     async def get_contract_name(self, contract_address: str) -> Optional[str]:
         """
@@ -159,12 +366,5 @@ class EtherscanClient:
         Returns:
             Optional[str]: 合约名称
         """
-        try:
-            source_info = await self.get_contract_source_code(contract_address)
-            if not source_info:
-                return None
-            
-            return source_info.get("ContractName", "").strip() or None
-            
-        except Exception:
-            return None 
\ No newline at end of file
+        contract_meta = await self.get_contract_full(contract_address)
+        return contract_meta["name"] if contract_meta else None
\ No newline at end of file
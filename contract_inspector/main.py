@@ -3,50 +3,102 @@ Contract Inspector MCP Server - 使用 FastMCP
 根据官方规范编写的 EVM 合约信息查询工具
 """
 
-from mcp.server.fastmcp import FastMCP
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from mcp.server.fastmcp import Context, FastMCP
 from dotenv import load_dotenv
-import json
 import os
 import asyncio
 from .contract_analyzer import ContractAnalyzer
 from .config import config
+from .utils import safe_json_dumps
 
 # 加载环境变量
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """服务器生命周期：关闭时释放分析器持有的连接"""
+    try:
+        yield
+    finally:
+        await analyzer.close()
+
+
 # 创建 FastMCP 实例
-mcp = FastMCP("contract-inspector")
+mcp = FastMCP("contract-inspector", lifespan=lifespan)
 
 # 初始化合约分析器
 analyzer = ContractAnalyzer()
 
 
+def _validate_and_parse(contract_address: str) -> bytes:
+    """
+    校验合约地址格式并解析为 20 字节地址
+    
+    Args:
+        contract_address: 0x 开头的 42 位十六进制地址字符串
+        
+    Returns:
+        bytes: 20 字节地址
+        
+    Raises:
+        ValueError: 地址为空或格式无效
+    """
+    if not contract_address or not isinstance(contract_address, str):
+        raise ValueError("合约地址不能为空且必须是字符串")
+    
+    if len(contract_address) != 42 or contract_address[:2].lower() != "0x":
+        raise ValueError("合约地址格式无效，必须是0x开头的42位十六进制字符串")
+    
+    try:
+        address_bytes = bytes.fromhex(contract_address[2:])
+    except ValueError as e:
+        raise ValueError("合约地址格式无效，必须是0x开头的42位十六进制字符串") from e
+    
+    # bytes.fromhex 会忽略空白字符，需再确认长度
+    if len(address_bytes) != 20:
+        raise ValueError("合约地址格式无效，必须是0x开头的42位十六进制字符串")
+    
+    return address_bytes
+
+
 @mcp.tool()
-async def contract_info(contract_address: str):
+async def contract_info(contract_address: str, ctx: Context):
     """
     获取 EVM 合约的完整链上信息，包括调用所有无参数的 view 函数
     
+    每个函数调用完成时会发送进度通知，最终返回完整结果
+    
     Args:
         contract_address: EVM 合约地址 (0x开头的42位十六进制字符串)
+        ctx: FastMCP 请求上下文，用于发送进度通知
     
     Returns:
         合约的详细信息，包括基础信息和所有view函数的调用结果
     """
     # 验证合约地址格式
-    if not contract_address or not isinstance(contract_address, str):
-        raise ValueError("合约地址不能为空且必须是字符串")
-    
-    if not contract_address.startswith("0x") or len(contract_address) != 42:
-        raise ValueError("合约地址格式无效，必须是0x开头的42位十六进制字符串")
+    address_bytes = _validate_and_parse(contract_address)
     
     try:
         print(f"🔍 开始分析合约: {contract_address}")
         
+        async def report_result(call_result, completed: int, total: int):
+            try:
+                await ctx.report_progress(completed, total)
+                await ctx.info(
+                    f"[{completed}/{total}] {call_result['function_name']}: {call_result['status']}"
+                )
+            except Exception as e:
+                # 通知发送失败不影响分析本身
+                print(f"发送进度通知失败: {str(e)}")
+        
         # 执行合约分析
-        result = await analyzer.analyze_contract(contract_address)
+        result = await analyzer.analyze_contract(address_bytes, on_result=report_result)
         
-        # 格式化输出
-        formatted_result = json.dumps(result, ensure_ascii=False, indent=2)
+        # view 函数结果中常有 uint256 大整数，直接使用标准库编码
+        formatted_result = safe_json_dumps(result, allow_big_ints=True)
         
         print(f"✅ 合约分析完成: {contract_address}")
         
@@ -63,7 +115,7 @@ async def contract_info(contract_address: str):
             "tool": "contract_info"
         }
         
-        return json.dumps(error_response, ensure_ascii=False, indent=2)
+        return safe_json_dumps(error_response)
 
 
 @mcp.tool()
@@ -78,20 +130,16 @@ async def contract_summary(contract_address: str):
         合约的基本摘要信息
     """
     # 验证合约地址格式
-    if not contract_address or not isinstance(contract_address, str):
-        raise ValueError("合约地址不能为空且必须是字符串")
-    
-    if not contract_address.startswith("0x") or len(contract_address) != 42:
-        raise ValueError("合约地址格式无效，必须是0x开头的42位十六进制字符串")
+    address_bytes = _validate_and_parse(contract_address)
     
     try:
         print(f"📋 获取合约摘要: {contract_address}")
         
         # 获取合约摘要
-        result = await analyzer.get_contract_summary(contract_address)
+        result = await analyzer.get_contract_summary(address_bytes)
         
         # 格式化输出
-        formatted_result = json.dumps(result, ensure_ascii=False, indent=2)
+        formatted_result = safe_json_dumps(result)
         
         print(f"✅ 合约摘要获取完成: {contract_address}")
         
@@ -108,7 +156,7 @@ async def contract_summary(contract_address: str):
             "tool": "contract_summary"
         }
         
-        return json.dumps(error_response, ensure_ascii=False, indent=2)
+        return safe_json_dumps(error_response)
 
 
 def main():
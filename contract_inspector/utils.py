@@ -4,29 +4,46 @@
 
 import re
 import json
+import time
 import asyncio
-from typing import Any, Dict, List, Optional
+import functools
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Type, TypeVar, Union
+import aiohttp
+import orjson
 from web3 import Web3
 
 
-def is_valid_ethereum_address(address: str) -> bool:
+# 以太坊地址格式：0x 开头 + 40 位十六进制字符
+_ETH_ADDR_RE = re.compile(r'0x[a-fA-F0-9]{40}')
+
+# 只读函数的 stateMutability 取值
+_VIEW_MUTABILITIES = frozenset(("view", "pure"))
+
+# 值得重试的 HTTP 状态码
+RETRYABLE_STATUS_CODES = frozenset((429, 500, 502, 503, 504))
+
+T = TypeVar("T")
+
+
+def is_valid_ethereum_address(address: Union[str, bytes]) -> bool:
     """
     验证以太坊地址格式是否有效
     
     Args:
-        address: 以太坊地址字符串
+        address: 以太坊地址字符串，或已解析的 20 字节地址
         
     Returns:
         bool: 地址是否有效
     """
-    if not address:
-        return False
+    if isinstance(address, (bytes, bytearray)):
+        return len(address) == 20
     
-    # 检查是否以 0x 开头且长度为 42
-    if not re.match(r'^0x[a-fA-F0-9]{40}$', address):
+    # 先做廉价的长度和前缀检查，再走正则
+    if not address or len(address) != 42 or not address.startswith("0x"):
         return False
     
-    return True
+    return _ETH_ADDR_RE.fullmatch(address) is not None
 
 
 def is_checksum_address(address: str) -> bool:
@@ -45,22 +62,40 @@ def is_checksum_address(address: str) -> bool:
         return False
 
 
-def to_checksum_address(address: str) -> str:
+def to_checksum_address(address: Union[str, bytes]) -> str:
     """
     将地址转换为校验和格式
     
     Args:
-        address: 以太坊地址字符串
+        address: 以太坊地址字符串，或 20 字节地址
         
     Returns:
         str: 校验和格式的地址
     """
+    if isinstance(address, (bytes, bytearray)):
+        address = "0x" + bytes(address).hex()
+    
     try:
-        return Web3.to_checksum_address(address)
+        # 统一小写后再查缓存，使不同大小写的同一地址共享缓存项
+        return _to_checksum_cached(address.lower())
     except Exception:
         return address
 
 
+@functools.lru_cache(maxsize=4096)
+def _to_checksum_cached(address: str) -> str:
+    """
+    带缓存的校验和地址转换（避免重复计算 keccak256）
+    
+    Args:
+        address: 小写的以太坊地址字符串
+        
+    Returns:
+        str: 校验和格式的地址
+    """
+    return Web3.to_checksum_address(address)
+
+
 def format_wei_value(value: int, decimals: int = 18) -> str:
     """
     格式化 Wei 值为可读的小数格式
@@ -97,32 +132,148 @@ def safe_json_loads(data: str) -> Optional[Any]:
         解析后的数据或 None
     """
     try:
-        return json.loads(data)
-    except (json.JSONDecodeError, TypeError):
+        return orjson.loads(data)
+    except (orjson.JSONDecodeError, TypeError):
         return None
 
 
-def extract_view_functions(abi: List[Dict]) -> List[Dict]:
+def _json_default(obj: Any) -> Any:
+    """JSON 序列化的兜底处理：bytes（含 HexBytes）输出为 0x 开头的十六进制字符串"""
+    if isinstance(obj, (bytes, bytearray)):
+        return "0x" + bytes(obj).hex()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def safe_json_dumps(data: Any, allow_big_ints: bool = False) -> str:
     """
-    从 ABI 中提取无参数的 view 函数
+    将数据格式化为带缩进的 JSON 字符串
+    
+    orjson 仅支持 64 位整数，可能包含 uint256 等大整数的数据
+    需传入 allow_big_ints=True，直接使用标准库编码
+    
+    Args:
+        data: 要序列化的数据
+        allow_big_ints: 数据中是否可能包含超过 64 位的整数
+        
+    Returns:
+        str: JSON 字符串
+    """
+    if allow_big_ints:
+        return json.dumps(data, ensure_ascii=False, indent=2, default=_json_default)
+    
+    return orjson.dumps(
+        data,
+        default=_json_default,
+        option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+    ).decode()
+
+
+def is_view_function_without_inputs(item: Dict) -> bool:
+    """
+    判断 ABI 条目是否为无参数的 view/pure 函数
+    
+    Args:
+        item: ABI 条目
+        
+    Returns:
+        bool: 是否符合条件
+    """
+    # 依次检查开销最小的条件
+    return (
+        item.get("type") == "function"
+        and not item.get("inputs")
+        and item.get("stateMutability") in _VIEW_MUTABILITIES
+    )
+
+
+def extract_view_call_plan(abi: List[Dict]) -> Tuple[Tuple[str, ...], Dict[str, str]]:
+    """
+    一次遍历 ABI，得到无参数 view 函数的名称及其输出类型
     
     Args:
         abi: 合约 ABI 列表
         
     Returns:
-        List[Dict]: 符合条件的函数列表
+        Tuple: (函数名称元组, 函数名称到输出类型的映射)
+            输出类型：无返回值为 "void"，单个返回值为其类型，多个返回值为 "tuple"
     """
-    view_functions = []
+    output_types = {}
     
     for item in abi:
-        if (
-            item.get("type") == "function" and
-            item.get("stateMutability") in ["view", "pure"] and
-            len(item.get("inputs", [])) == 0
-        ):
-            view_functions.append(item)
+        if is_view_function_without_inputs(item):
+            outputs = item.get("outputs") or []
+            if not outputs:
+                output_type = "void"
+            elif len(outputs) == 1:
+                output_type = outputs[0].get("type", "unknown")
+            else:
+                output_type = "tuple"
+            output_types[item["name"]] = output_type
+    
+    return tuple(output_types), output_types
+
+
+def _abi_type_string(param: Dict) -> str:
+    """
+    将 ABI 参数描述转换为 eth_abi 可识别的类型字符串
+    
+    Args:
+        param: ABI 参数描述
+        
+    Returns:
+        str: 类型字符串，如 "uint256"、"(address,uint256)[]"
+    """
+    abi_type = param.get("type", "")
+    if abi_type.startswith("tuple"):
+        components = ",".join(
+            _abi_type_string(component)
+            for component in param.get("components", [])
+        )
+        return f"({components}){abi_type[len('tuple'):]}"
+    return abi_type
+
+
+def get_abi_output_types(func_abi: Dict) -> List[str]:
+    """
+    获取函数 ABI 的输出类型列表
+    
+    Args:
+        func_abi: 函数 ABI
+        
+    Returns:
+        List[str]: 输出类型列表
+    """
+    return [_abi_type_string(output) for output in func_abi.get("outputs", [])]
+
+
+def _checksum_abi_value(param: Dict, value: Any) -> Any:
+    """按 ABI 参数类型递归地将地址类型的值转换为校验和格式"""
+    abi_type = param.get("type", "")
+    if abi_type.endswith("]"):
+        item_param = dict(param, type=abi_type[:abi_type.rindex("[")])
+        return type(value)(_checksum_abi_value(item_param, item) for item in value)
+    if abi_type == "tuple":
+        return type(value)(
+            _checksum_abi_value(component, item)
+            for component, item in zip(param.get("components", []), value)
+        )
+    if abi_type == "address" and isinstance(value, str):
+        return to_checksum_address(value)
+    return value
+
+
+def checksum_abi_addresses(params: List[Dict], values: Sequence[Any]) -> Tuple[Any, ...]:
+    """
+    将 eth_abi 解码结果中的地址转换为校验和格式（与 web3 的 call() 返回一致）
     
-    return view_functions
+    Args:
+        params: ABI 参数描述列表（如函数的 outputs）
+        values: eth_abi 解码得到的值
+        
+    Returns:
+        Tuple: 地址已转换为校验和格式的值
+    """
+    return tuple(_checksum_abi_value(param, value) for param, value in zip(params, values))
 
 
 def format_function_result(func_name: str, result: Any, output_type: str) -> Dict[str, Any]:
@@ -155,45 +306,93 @@ def format_function_result(func_name: str, result: Any, output_type: str) -> Dic
     return formatted_result
 
 
-async def retry_with_backoff(
-    func, 
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    解析 HTTP Retry-After 头
+    
+    Args:
+        value: Retry-After 头的值（秒数或 HTTP 日期）
+        
+    Returns:
+        Optional[float]: 需要等待的秒数，无法解析时返回 None
+    """
+    if not value:
+        return None
+    
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    """
+    判断异常是否值得重试
+    
+    仅重试连接错误、超时以及 429/5xx 响应；其他 4xx 和业务错误立即失败
+    
+    Args:
+        exc: 异常
+        
+    Returns:
+        bool: 是否可重试
+    """
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status in RETRYABLE_STATUS_CODES
+    if isinstance(exc, (aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+        return True
+    
+    # 其余底层连接错误
+    return isinstance(exc, OSError)
+
+
+def _get_retry_after(exc: BaseException) -> Optional[float]:
+    """从 HTTP 错误中读取 Retry-After 等待时间"""
+    headers = getattr(exc, "headers", None)
+    if not headers:
+        return None
+    return parse_retry_after(headers.get("Retry-After"))
+
+
+async def retry_async(
+    coro_fn: Callable[[], Awaitable[T]], 
     max_retries: int = 3, 
     base_delay: float = 1.0,
     backoff_factor: float = 2.0,
-    *args, 
-    **kwargs
-) -> Any:
+    retry_on: Tuple[Type[BaseException], ...] = ()
+) -> T:
     """
-    带指数退避的重试机制
+    带指数退避的异步重试机制
     
     Args:
-        func: 要重试的函数
+        coro_fn: 每次调用返回一个新的可等待对象
         max_retries: 最大重试次数
         base_delay: 基础延迟时间（秒）
         backoff_factor: 退避因子
-        *args, **kwargs: 传递给函数的参数
+        retry_on: 除 is_retryable_error 判定外，额外需要重试的异常类型
         
     Returns:
-        函数执行结果
+        执行结果
     """
-    last_exception = None
-    
     for attempt in range(max_retries + 1):
         try:
-            if asyncio.iscoroutinefunction(func):
-                return await func(*args, **kwargs)
-            else:
-                return func(*args, **kwargs)
+            return await coro_fn()
         except Exception as e:
-            last_exception = e
+            if attempt == max_retries or not (isinstance(e, retry_on) or is_retryable_error(e)):
+                raise
             
-            if attempt == max_retries:
-                break
-                
             delay = base_delay * (backoff_factor ** attempt)
+            retry_after = _get_retry_after(e)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
             await asyncio.sleep(delay)
     
-    raise last_exception
+    raise AssertionError("unreachable")
 
 
 def truncate_string(text: str, max_length: int = 100) -> str:
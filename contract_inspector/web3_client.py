@@ -3,20 +3,127 @@ Web3 客户端
 """
 
 import asyncio
-from typing import Any, Dict, List, Optional
-from web3 import Web3
+import functools
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+import aiohttp
+from eth_abi import decode as abi_decode
+from web3 import AsyncHTTPProvider, AsyncWeb3, Web3
 from web3.exceptions import ContractLogicError, Web3Exception
 
 from .config import config
-from .utils import retry_with_backoff, to_checksum_address
+from .utils import (
+    checksum_abi_addresses,
+    get_abi_output_types,
+    is_view_function_without_inputs,
+    retry_async,
+    to_checksum_address
+)
+
+
+# Multicall3 在各主流 EVM 链上的统一部署地址
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+# 仅包含 aggregate3 的精简 ABI
+MULTICALL3_ABI = [
+    {
+        "type": "function",
+        "name": "aggregate3",
+        "stateMutability": "payable",
+        "inputs": [
+            {
+                "name": "calls",
+                "type": "tuple[]",
+                "components": [
+                    {"name": "target", "type": "address"},
+                    {"name": "allowFailure", "type": "bool"},
+                    {"name": "callData", "type": "bytes"}
+                ]
+            }
+        ],
+        "outputs": [
+            {
+                "name": "returnData",
+                "type": "tuple[]",
+                "components": [
+                    {"name": "success", "type": "bool"},
+                    {"name": "returnData", "type": "bytes"}
+                ]
+            }
+        ]
+    }
+]
+
+
+@functools.lru_cache(maxsize=4096)
+def _zero_arg_selector(function_name: str) -> bytes:
+    """
+    计算无参数函数的 4 字节选择器
+    
+    Args:
+        function_name: 函数名称
+        
+    Returns:
+        bytes: 函数选择器
+    """
+    return bytes(Web3.keccak(text=f"{function_name}()")[:4])
 
 
 class Web3Client:
     """Web3 客户端"""
     
     def __init__(self):
-        self.w3 = Web3(Web3.HTTPProvider(config.rpc_url))
+        self.w3 = AsyncWeb3(AsyncHTTPProvider(
+            config.rpc_url,
+            request_kwargs={"timeout": aiohttp.ClientTimeout(total=config.request_timeout)},
+            # 关闭 web3 内置重试，统一由 retry_async 处理（区分可重试状态码并遵循 Retry-After）
+            exception_retry_configuration=None
+        ))
+        self.multicall3 = self.w3.eth.contract(
+            address=MULTICALL3_ADDRESS,
+            abi=MULTICALL3_ABI
+        )
+        self._call_sema = asyncio.Semaphore(config.max_concurrent_calls)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_lock = asyncio.Lock()
+        self._multicall3_available: Optional[bool] = None
         self._connection_verified = False
+        # 所有 web3 请求都通过 asyncio.shield 发出：web3 的会话缓存锁
+        # 在等待中被取消时可能释放其他任务持有的锁，导致 provider 永久卡死
+    
+    async def _ensure_session(self) -> aiohttp.ClientSession:
+        """
+        获取共享的 HTTP 会话（惰性创建）
+        
+        同一个会话同时交给 AsyncHTTPProvider 使用，
+        web3 调用与 JSON-RPC 批量请求共用连接池。
+        每个发起 RPC 请求的方法都需先调用本方法，
+        否则 web3 会自行创建会话且不再接受替换
+        
+        Returns:
+            aiohttp.ClientSession: HTTP 会话
+        """
+        if self._session is not None and not self._session.closed:
+            return self._session
+        
+        # 加锁：会话交给 provider 之前，并发调用方不能提前发起 web3 请求
+        async with self._session_lock:
+            if self._session is None or self._session.closed:
+                session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(
+                        limit=config.max_concurrent_calls,
+                        keepalive_timeout=30
+                    ),
+                    timeout=aiohttp.ClientTimeout(total=config.request_timeout)
+                )
+                await self.w3.provider.cache_async_session(session)
+                self._session = session
+        return self._session
+    
+    async def close(self) -> None:
+        """释放 HTTP 会话"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
         
     async def verify_connection(self) -> bool:
         """
@@ -26,11 +133,10 @@ class Web3Client:
             bool: 连接是否成功
         """
         try:
-            def check_connection():
-                return self.w3.is_connected()
+            await self._ensure_session()
             
-            self._connection_verified = await retry_with_backoff(
-                check_connection,
+            self._connection_verified = await retry_async(
+                lambda: asyncio.shield(self.w3.is_connected()),
                 max_retries=3
             )
             
@@ -57,15 +163,13 @@ class Web3Client:
         """
         try:
             checksum_address = to_checksum_address(address)
+            await self._ensure_session()
             
-            def get_code():
-                code = self.w3.eth.get_code(checksum_address)
-                return len(code) > 0
-            
-            return await retry_with_backoff(
-                get_code,
+            code = await retry_async(
+                lambda: asyncio.shield(self.w3.eth.get_code(checksum_address)),
                 max_retries=config.max_retries
             )
+            return len(code) > 0
             
         except Exception as e:
             print(f"检查合约地址时发生错误: {str(e)}")
@@ -85,15 +189,10 @@ class Web3Client:
         try:
             checksum_address = to_checksum_address(address)
             
-            def create_contract():
-                return self.w3.eth.contract(
-                    address=checksum_address,
-                    abi=abi
-                )
-            
-            return await retry_with_backoff(
-                create_contract,
-                max_retries=config.max_retries
+            # 仅在本地构建合约对象，不涉及网络请求，无需重试
+            return self.w3.eth.contract(
+                address=checksum_address,
+                abi=abi
             )
             
         except Exception as e:
@@ -102,22 +201,20 @@ class Web3Client:
     
     async def call_view_function(
         self, 
-        contract: Any, 
-        function_name: str
+        function_name: str, 
+        func: Any
     ) -> Dict[str, Any]:
         """
         调用合约的 view 函数
         
         Args:
-            contract: 合约实例
             function_name: 函数名称
+            func: 已从合约实例上解析出的函数对象，不存在时为 None
             
         Returns:
             Dict: 函数调用结果
         """
         try:
-            # 获取函数对象
-            func = getattr(contract.functions, function_name, None)
             if func is None:
                 return {
                     "function_name": function_name,
@@ -125,11 +222,9 @@ class Web3Client:
                     "error": f"函数 {function_name} 不存在"
                 }
             
-            def call_function():
-                return func().call()
-            
-            result = await retry_with_backoff(
-                call_function,
+            await self._ensure_session()
+            result = await retry_async(
+                lambda: asyncio.shield(func().call()),
                 max_retries=config.max_retries
             )
             
@@ -158,13 +253,97 @@ class Web3Client:
                 "error": f"未知错误: {str(e)}"
             }
     
-    async def batch_call_view_functions(
+    def _decode_call_result(
+        self, 
+        function_name: str, 
+        func_abi: Dict, 
+        data: bytes
+    ) -> Dict[str, Any]:
+        """
+        解码 eth_call 的原始返回数据
+        
+        Args:
+            function_name: 函数名称
+            func_abi: 函数 ABI
+            data: 原始返回数据
+            
+        Returns:
+            Dict: 函数调用结果
+        """
+        try:
+            decoded = checksum_abi_addresses(
+                func_abi.get("outputs", []),
+                abi_decode(get_abi_output_types(func_abi), data)
+            )
+            return {
+                "function_name": function_name,
+                "result": decoded[0] if len(decoded) == 1 else list(decoded),
+                "status": "success"
+            }
+        except Exception as e:
+            return {
+                "function_name": function_name,
+                "status": "error",
+                "error": f"返回值解码失败: {str(e)}"
+            }
+    
+    def _get_zero_arg_abis(self, contract: Any, function_names: Sequence[str]) -> Dict[str, Dict]:
+        """
+        获取各无参数 view 函数的 ABI
+        
+        Args:
+            contract: 合约实例
+            function_names: 函数名称列表
+            
+        Returns:
+            Dict[str, Dict]: 函数名称到 ABI 的映射
+            
+        Raises:
+            ValueError: 存在 ABI 中没有的函数时抛出
+        """
+        abi_by_name = {
+            item["name"]: item
+            for item in contract.abi
+            if is_view_function_without_inputs(item)
+        }
+        
+        for func_name in function_names:
+            if func_name not in abi_by_name:
+                raise ValueError(f"函数 {func_name} 不存在")
+        
+        return abi_by_name
+    
+    async def is_multicall3_available(self) -> bool:
+        """
+        检查当前链上的 Multicall3 标准地址是否部署了合约（结果会被缓存）
+        
+        Returns:
+            bool: Multicall3 是否可用
+        """
+        if self._multicall3_available is not None:
+            return self._multicall3_available
+        
+        try:
+            await self._ensure_session()
+            code = await retry_async(
+                lambda: asyncio.shield(self.w3.eth.get_code(MULTICALL3_ADDRESS)),
+                max_retries=config.max_retries
+            )
+            self._multicall3_available = len(code) > 0
+            return self._multicall3_available
+            
+        except Exception as e:
+            # 检查失败时不缓存结果，下次再试
+            print(f"检查 Multicall3 部署时发生错误: {str(e)}")
+            return False
+    
+    async def multicall_view_functions(
         self, 
         contract: Any, 
-        function_names: List[str]
+        function_names: Sequence[str]
     ) -> List[Dict[str, Any]]:
         """
-        批量调用 view 函数
+        通过 Multicall3 的 aggregate3 在一次 eth_call 中调用所有 view 函数
         
         Args:
             contract: 合约实例
@@ -172,28 +351,223 @@ class Web3Client:
             
         Returns:
             List[Dict]: 所有函数调用结果
+            
+        Raises:
+            Exception: Multicall3 调用本身失败时抛出
         """
-        # 并发调用所有函数
-        tasks = [
-            self.call_view_function(contract, func_name)
+        abi_by_name = self._get_zero_arg_abis(contract, function_names)
+        
+        # 无参数函数的 calldata 即为 4 字节选择器
+        calls = [
+            (contract.address, True, _zero_arg_selector(func_name))
             for func_name in function_names
         ]
         
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        await self._ensure_session()
+        return_data = await retry_async(
+            lambda: asyncio.shield(self.multicall3.functions.aggregate3(calls).call()),
+            max_retries=config.max_retries
+        )
+        
+        results = []
+        for func_name, (success, data) in zip(function_names, return_data):
+            if not success:
+                results.append({
+                    "function_name": func_name,
+                    "status": "error",
+                    "error": "合约逻辑错误: 调用被回滚"
+                })
+            else:
+                results.append(self._decode_call_result(func_name, abi_by_name[func_name], data))
+        
+        return results
+    
+    async def rpc_batch_view_functions(
+        self, 
+        contract: Any, 
+        function_names: Sequence[str]
+    ) -> List[Dict[str, Any]]:
+        """
+        通过 JSON-RPC 批量请求在一次 HTTP 往返中发出所有 eth_call
+        
+        Args:
+            contract: 合约实例
+            function_names: 函数名称列表
+            
+        Returns:
+            List[Dict]: 所有函数调用结果
+            
+        Raises:
+            Exception: 批量请求本身失败或节点不支持批量请求时抛出
+        """
+        abi_by_name = self._get_zero_arg_abis(contract, function_names)
+        
+        payload = [
+            {
+                "jsonrpc": "2.0",
+                "id": i,
+                "method": "eth_call",
+                "params": [
+                    {
+                        "to": contract.address,
+                        "data": "0x" + _zero_arg_selector(func_name).hex()
+                    },
+                    "latest"
+                ]
+            }
+            for i, func_name in enumerate(function_names)
+        ]
+        
+        session = await self._ensure_session()
+        
+        async def post_batch():
+            async with session.post(config.rpc_url, json=payload) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
         
-        # 处理异常结果
-        processed_results = []
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                processed_results.append({
-                    "function_name": function_names[i],
+        responses = await retry_async(
+            post_batch,
+            max_retries=config.max_retries
+        )
+        
+        if not isinstance(responses, list):
+            raise ValueError("RPC 节点不支持 JSON-RPC 批量请求")
+        
+        # 批量响应的顺序不保证与请求一致，按 id 对应
+        responses_by_id = {
+            item.get("id"): item
+            for item in responses
+            if isinstance(item, dict)
+        }
+        
+        results = []
+        for i, func_name in enumerate(function_names):
+            item = responses_by_id.get(i)
+            if item is None:
+                results.append({
+                    "function_name": func_name,
+                    "status": "error",
+                    "error": "RPC 批量响应中缺少该调用的结果"
+                })
+            elif item.get("error"):
+                error = item["error"]
+                message = error.get("message", "未知错误") if isinstance(error, dict) else str(error)
+                results.append({
+                    "function_name": func_name,
                     "status": "error",
-                    "error": f"调用异常: {str(result)}"
+                    "error": f"RPC 错误: {message}"
                 })
             else:
-                processed_results.append(result)
+                data = bytes.fromhex(str(item.get("result") or "0x")[2:])
+                results.append(self._decode_call_result(func_name, abi_by_name[func_name], data))
+        
+        return results
+    
+    async def _iter_call_view_functions(
+        self, 
+        contract: Any, 
+        function_names: Sequence[str]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        逐个并发调用 view 函数，按完成顺序产出结果
+        
+        Args:
+            contract: 合约实例
+            function_names: 函数名称列表
+            
+        Yields:
+            Dict: 单个函数调用结果
+        """
+        # 一次性解析所有函数对象，避免每次调用都重新查找 ABI
+        fn_map = {
+            func_name: getattr(contract.functions, func_name, None)
+            for func_name in function_names
+        }
+        
+        done_queue: asyncio.Queue = asyncio.Queue()
+        task_names: Dict[asyncio.Task, str] = {}
+        
+        def on_done(task: asyncio.Task) -> None:
+            self._call_sema.release()
+            done_queue.put_nowait(task)
+        
+        # 限制同时进行的调用数量；在创建任务前获取信号量，
+        # 避免 ABI 很大时一次性创建大量等待中的任务。
+        # 任务结束（包括被取消）时通过回调释放信号量并放入完成队列
+        async def spawn_calls() -> None:
+            for func_name in function_names:
+                await self._call_sema.acquire()
+                task = asyncio.create_task(self.call_view_function(func_name, fn_map[func_name]))
+                task_names[task] = func_name
+                task.add_done_callback(on_done)
+        
+        spawner = asyncio.create_task(spawn_calls())
+        try:
+            for _ in function_names:
+                task = await done_queue.get()
+                if task.cancelled():
+                    yield {
+                        "function_name": task_names[task],
+                        "status": "error",
+                        "error": "调用被取消"
+                    }
+                elif task.exception() is not None:
+                    yield {
+                        "function_name": task_names[task],
+                        "status": "error",
+                        "error": f"调用异常: {str(task.exception())}"
+                    }
+                else:
+                    yield task.result()
+        finally:
+            # 只取消派发任务；已发出的调用任务让其自然结束（回调会释放信号量），
+            # 取消正在等待 web3 内部锁的任务会导致锁被错误释放
+            spawner.cancel()
+    
+    async def iter_view_function_results(
+        self, 
+        contract: Any, 
+        function_names: Sequence[str]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        批量调用 view 函数，结果一旦可用就产出
         
-        return processed_results
+        优先通过 Multicall3 在一次 RPC 往返内完成全部调用；
+        Multicall3 未部署或调用失败时改用 JSON-RPC 批量请求；
+        两者都失败时回退为逐个并发调用（并发数受 max_concurrent_calls 限制），
+        此时按完成顺序逐个产出结果。
+        
+        Args:
+            contract: 合约实例
+            function_names: 函数名称列表
+            
+        Yields:
+            Dict: 单个函数调用结果
+        """
+        if not function_names:
+            return
+        
+        results = None
+        
+        if await self.is_multicall3_available():
+            try:
+                results = await self.multicall_view_functions(contract, function_names)
+            except Exception as e:
+                print(f"Multicall3 调用失败，改用 JSON-RPC 批量请求: {str(e)}")
+        
+        if results is None:
+            try:
+                results = await self.rpc_batch_view_functions(contract, function_names)
+            except Exception as e:
+                print(f"JSON-RPC 批量请求失败，回退为逐个调用: {str(e)}")
+        
+        if results is not None:
+            for result in results:
+                yield result
+            return
+        
+        async for result in self._iter_call_view_functions(contract, function_names):
+            yield result
     
     async def get_block_number(self) -> Optional[int]:
         """
@@ -203,11 +577,9 @@ class Web3Client:
             Optional[int]: 区块号
         """
         try:
-            def get_latest_block():
-                return self.w3.eth.block_number
-            
-            return await retry_with_backoff(
-                get_latest_block,
+            await self._ensure_session()
+            return await retry_async(
+                lambda: asyncio.shield(self.w3.eth.block_number),
                 max_retries=config.max_retries
             )
             